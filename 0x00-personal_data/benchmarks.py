@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+""" Benchmarks for the redaction of personal data
+
+Usage:
+    ./benchmarks.py <name> [args...]
+"""
+from typing import List
+import bcrypt
+import csv
+import logging
+import os
+import re
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+
+from encrypt_password import HashingService
+from filtered_logger import (
+    PII_FIELDS, USER_FIELDS, ConnectionPool, RedactingFormatter, Redactor,
+    TokenRedactor, export_users, export_users_parallel, filter_datum)
+
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'user_data.csv')
+
+
+def _rows() -> List[list]:
+    """ Rows of user_data.csv, without the header
+    """
+    with open(CSV_PATH, newline='') as f:
+        reader = csv.reader(f)
+        next(reader)
+        return list(reader)
+
+
+def _messages() -> List[str]:
+    """ One key=value log message per row of user_data.csv
+    """
+    columns = USER_FIELDS.split(',')
+    return ['{};'.format('; '.join(
+                '{}={}'.format(k, v) for k, v in zip(columns, row)))
+            for row in _rows()]
+
+
+def _users_db(path: str, count: int) -> sqlite3.Connection:
+    """ SQLite stand-in for get_db with count users shaped like the
+        rows of user_data.csv
+    """
+    rows = _rows()
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users ({})".format(USER_FIELDS))
+    conn.executemany(
+        "INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (rows[i % len(rows)] for i in range(count)))
+    conn.commit()
+    return conn
+
+
+def _null_logger(name: str) -> logging.Logger:
+    """ Logger redacting like get_logger into /dev/null
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = logging.StreamHandler(open(os.devnull, 'w'))
+    handler.setFormatter(RedactingFormatter(PII_FIELDS))
+    logger.addHandler(handler)
+    return logger
+
+
+def _uncompiled_filter_datum(fields: List[str], redaction: str,
+                             message: str, separator: str) -> str:
+    """ filter_datum as it was before the regex was compiled once
+    """
+    return re.sub(r'(?P<field>{})=[^{}]*'.format('|'.join(fields), separator),
+                  r'\g<field>={}'.format(redaction), message)
+
+
+def _rate(function, messages: List[str], rounds: int) -> float:
+    """ Messages per second going through function
+    """
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            function(message)
+    return rounds * len(messages) / (time.perf_counter() - start)
+
+
+def bench_filter_datum(rounds: str = "20") -> None:
+    """ Lines/second redacted by filter_datum and RedactingFormatter
+        before and after compiling the regex once
+    """
+    rounds = int(rounds)
+    messages = _messages()
+    fields = list(PII_FIELDS)
+    formatter = RedactingFormatter(fields)
+    records = [logging.LogRecord("user_data", logging.INFO, None, None,
+                                 message, None, None)
+               for message in messages]
+
+    print("{} lines x {}".format(len(messages), rounds))
+    print("  filter_datum, uncompiled: {:>9.0f} lines/s".format(_rate(
+        lambda m: _uncompiled_filter_datum(fields, '***', m, ';'),
+        messages, rounds)))
+    print("  filter_datum, cached:     {:>9.0f} lines/s".format(_rate(
+        lambda m: filter_datum(fields, '***', m, ';'), messages, rounds)))
+    print("  RedactingFormatter:       {:>9.0f} lines/s".format(_rate(
+        formatter.format, records, rounds)))
+
+
+def bench_tokenizer(rounds: str = "20") -> None:
+    """ Lines/second of RedactingFormatter with the regex and the
+        tokenizing redactor, after checking both give the same output
+    """
+    rounds = int(rounds)
+    messages = _messages()
+    records = [logging.LogRecord("user_data", logging.INFO, None, None,
+                                 message, None, None)
+               for message in messages]
+    regex = RedactingFormatter(PII_FIELDS, Redactor)
+    tokens = RedactingFormatter(PII_FIELDS, TokenRedactor)
+    for record in records:
+        message = logging.Formatter.format(regex, record)
+        if regex.redactor.redact(message) != tokens.redactor.redact(message):
+            raise AssertionError("Different output for {}".format(message))
+
+    print("{} lines x {}, identical output".format(len(messages), rounds))
+    print("  Redactor:      {:>9.0f} lines/s".format(_rate(
+        regex.format, records, rounds)))
+    print("  TokenRedactor: {:>9.0f} lines/s".format(_rate(
+        tokens.format, records, rounds)))
+
+
+def bench_export(count: str = "200000", batch_size: str = "1000") -> None:
+    """ Rows/second and peak RSS of export_users on a SQLite users
+        table of count rows
+    """
+    count, batch_size = int(count), int(batch_size)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = _users_db(os.path.join(tmp, 'users.db'), count)
+        start = time.perf_counter()
+        exported = export_users(conn, _null_logger('bench_export'),
+                                batch_size)
+        elapsed = time.perf_counter() - start
+        conn.close()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print("{} rows in {:.2f}s: {:.0f} rows/s, peak RSS {:.1f} MB".format(
+        exported, elapsed, exported / elapsed, peak))
+
+
+def bench_pipeline(count: str = "200000", batch_size: str = "2000") -> None:
+    """ Rows/second of export_users against export_users_parallel with
+        1, 2, 4 and 8 worker processes on count generated users
+    """
+    count, batch_size = int(count), int(batch_size)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = _users_db(os.path.join(tmp, 'users.db'), count)
+        start = time.perf_counter()
+        export_users(conn, _null_logger('bench_pipeline'), batch_size)
+        elapsed = time.perf_counter() - start
+        print("sequential: {:>9.0f} rows/s".format(count / elapsed))
+        with open(os.devnull, 'w') as devnull:
+            for workers in (1, 2, 4, 8):
+                start = time.perf_counter()
+                export_users_parallel(conn, devnull, workers, batch_size)
+                elapsed = time.perf_counter() - start
+                print("{} workers: {:>9.0f} rows/s".format(
+                    workers, count / elapsed))
+        conn.close()
+
+
+def bench_pool(count: str = "200", handshake_ms: str = "5") -> None:
+    """ Average acquire latency of count get/close cycles with and
+        without the pool, on SQLite connections whose opening is slowed
+        down by handshake_ms to stand in for the MySQL TCP + auth
+    """
+    count, handshake = int(count), float(handshake_ms) / 1000
+
+    def connect() -> sqlite3.Connection:
+        time.sleep(handshake)
+        return sqlite3.connect(':memory:', check_same_thread=False)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        connect().close()
+    direct = (time.perf_counter() - start) / count
+
+    pool = ConnectionPool(connect, size=4)
+    start = time.perf_counter()
+    for _ in range(count):
+        pool.acquire().close()
+    pooled = (time.perf_counter() - start) / count
+    pool.close()
+
+    print("{} acquisitions, {}ms handshake".format(count, handshake_ms))
+    print("  connect: {:>8.3f} ms".format(direct * 1000))
+    print("  pool:    {:>8.3f} ms".format(pooled * 1000))
+
+
+def bench_hashing(count: str = "32", rounds: str = "10") -> None:
+    """ Verifications/second of HashingService.verify_many with 1, 2, 4
+        and 8 threads on count bcrypt hashes of cost rounds
+    """
+    count, rounds = int(count), int(rounds)
+    salt = bcrypt.gensalt(rounds=rounds)
+    pairs = [(bcrypt.hashpw(b'password', salt), 'password')] * count
+    for workers in (1, 2, 4, 8):
+        with HashingService(workers) as service:
+            start = time.perf_counter()
+            service.verify_many(pairs)
+            elapsed = time.perf_counter() - start
+        print("{} threads: {:>7.1f} verifications/s".format(
+            workers, count / elapsed))
+
+
+BENCHMARKS = {
+    'filter_datum': bench_filter_datum,
+    'tokenizer': bench_tokenizer,
+    'export': bench_export,
+    'pipeline': bench_pipeline,
+    'pool': bench_pool,
+    'hashing': bench_hashing,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print("Usage: {} <{}> [args...]".format(
+            sys.argv[0], "|".join(BENCHMARKS)))
+        sys.exit(1)
+    BENCHMARKS[sys.argv[1]](*sys.argv[2:])
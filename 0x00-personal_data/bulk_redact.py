@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Redact PII in whole files: key=value log dumps or CSV exports
+"""
+from typing import Iterable, List
+import argparse
+import csv
+import mmap
+import os
+import sys
+import time
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, Redactor
+
+
+CHUNK_SIZE = 1 << 22
+
+
+def iter_line_chunks(f, chunk_size: int = CHUNK_SIZE,
+                     use_mmap: bool = False) -> Iterable[str]:
+    """ Yield the content of the binary file f by chunks of about
+        chunk_size bytes, each one ending at the end of a line
+      - use_mmap: slice a memory map of the file instead of reading it
+    """
+    if use_mmap:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while start < len(mm):
+                end = mm.find(b'\n', start + chunk_size)
+                end = len(mm) if end == -1 else end + 1
+                yield mm[start:end].decode('utf-8')
+                start = end
+        return
+
+    rest = b''
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        chunk = rest + chunk
+        end = chunk.rfind(b'\n') + 1
+        if end == 0:
+            rest = chunk
+            continue
+        rest = chunk[end:]
+        yield chunk[:end].decode('utf-8')
+    if rest:
+        yield rest.decode('utf-8')
+
+
+def redact_log_file(src: str, dst: str, fields: List[str] = PII_FIELDS,
+                    redaction: str = RedactingFormatter.REDACTION,
+                    separator: str = RedactingFormatter.SEPARATOR,
+                    chunk_size: int = CHUNK_SIZE,
+                    use_mmap: bool = False) -> int:
+    """ Write to dst the key=value log file src with the values of
+        fields redacted, one chunk of lines at a time
+      - returns the number of bytes read
+    """
+    # a value also stops at the end of its line, so that whole chunks
+    # can go through the regex at once
+    redactor = Redactor(fields, redaction, separator + '\r\n')
+    size = 0
+    with open(src, 'rb') as f_in, open(dst, 'w', encoding='utf-8') as f_out:
+        for chunk in iter_line_chunks(f_in, chunk_size, use_mmap):
+            size += len(chunk.encode('utf-8'))
+            f_out.write(redactor.redact(chunk))
+    return size
+
+
+def redact_csv_file(src: str, dst: str, fields: List[str] = PII_FIELDS,
+                    redaction: str = RedactingFormatter.REDACTION) -> int:
+    """ Write to dst the CSV file src with the columns named in fields
+        redacted, one row at a time
+      - returns the number of bytes read
+    """
+    with open(src, newline='', encoding='utf-8') as f_in, \
+            open(dst, 'w', newline='', encoding='utf-8') as f_out:
+        reader = csv.reader(f_in)
+        writer = csv.writer(f_out)
+        header = next(reader, None)
+        if header is None:
+            return 0
+        writer.writerow(header)
+        redacted = [i for i, column in enumerate(header) if column in fields]
+        for row in reader:
+            for i in redacted:
+                if i < len(row):
+                    row[i] = redaction
+            writer.writerow(row)
+    return os.path.getsize(src)
+
+
+def main() -> None:
+    """ Command line entry point, reports the throughput on stderr
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('src', help="file to redact")
+    parser.add_argument('dst', help="redacted copy to write")
+    parser.add_argument('--csv', action='store_true',
+                        help="src is CSV (default when it ends with .csv)")
+    parser.add_argument('--mmap', action='store_true',
+                        help="memory map src (key=value logs only)")
+    parser.add_argument('--fields', default=','.join(PII_FIELDS),
+                        help="comma separated fields to redact")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help="bytes read at a time (key=value logs only)")
+    args = parser.parse_args()
+    fields = args.fields.split(',')
+
+    start = time.perf_counter()
+    if args.csv or args.src.endswith('.csv'):
+        size = redact_csv_file(args.src, args.dst, fields)
+    else:
+        size = redact_log_file(args.src, args.dst, fields,
+                               chunk_size=args.chunk_size,
+                               use_mmap=args.mmap)
+    elapsed = time.perf_counter() - start
+    print("{:.1f} MB in {:.2f}s ({:.1f} MB/s)".format(
+        size / 1e6, elapsed, size / 1e6 / elapsed if elapsed else 0),
+        file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,135 @@
 #!/usr/bin/env python3
-import bycrypt
+"""
+hash_password and is_valid, and a HashingService running them on a
+pool of threads
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, List, Tuple
+import asyncio
+import bcrypt
+import threading
+import time
 
 
-def hash_password(password: str) -> bytes | bytearray:
+ROUNDS = 12
+
+
+def calibrate_rounds(target: float = 0.25, minimum: int = 10,
+                     maximum: int = 16) -> int:
+    """ Highest bcrypt cost, between minimum and maximum, whose hashing
+        takes at most target seconds on this machine
+      - each extra round doubles the time measured at minimum
+    """
+    salt = bcrypt.gensalt(rounds=minimum)
+    elapsed = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        bcrypt.hashpw(b'calibration', salt)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    rounds = minimum
+    while rounds < maximum and elapsed * 2 <= target:
+        rounds += 1
+        elapsed *= 2
+    return rounds
+
+
+def hash_rounds(hashed_password: bytes | bytearray) -> int:
+    """ Cost a bcrypt hash was computed with ($2b$<rounds>$...)
+    """
+    return int(hashed_password[4:6])
+
+
+def needs_rehash(hashed_password: bytes | bytearray,
+                 rounds: int = ROUNDS) -> bool:
+    """ True if hashed_password was computed with a lower cost than
+        rounds (a higher cost is kept, never downgraded)
+    """
+    return hash_rounds(hashed_password) < rounds
+
+
+def hash_password(password: str, rounds: int = ROUNDS) -> bytes | bytearray:
     """ Hash a password
     """
-    salt = bycrypt.gensalt(rounds=12)
+    salt = bcrypt.gensalt(rounds=rounds)
 
-    hashed_password = bycrypt.hashpw(password.encode('utf-8'), salt)
+    hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed_password
 
 def is_valid(hashed_password: bytes | bytearray, password: str) -> bool:
     """ Checks if a password matches the hashed_password
     """
-    return bycrypt.checkpw(password.encode('utf-8'), hashed_password)
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+
+
+class HashingService:
+    """ Runs hash_password and is_valid on a pool of workers threads,
+        bcrypt releases the GIL so they hash in parallel
+
+      - at most max_pending calls are queued or running: submitting more
+        blocks the caller until one finishes
+      - hash/verify return concurrent.futures.Future objects, the
+        *_async methods await them from asyncio code
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 1000):
+        self._executor = ThreadPoolExecutor(workers)
+        self._pending = threading.BoundedSemaphore(max_pending)
+
+    def __enter__(self) -> 'HashingService':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+
+    def _submit(self, function, *args) -> Future:
+        """ Run function(*args) on the pool once there is room for it
+        """
+        self._pending.acquire()
+        try:
+            future = self._executor.submit(function, *args)
+        except Exception:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda f: self._pending.release())
+        return future
+
+    def hash(self, password: str) -> Future:
+        """ Future of hash_password(password)
+        """
+        return self._submit(hash_password, password)
+
+    def verify(self, hashed_password: bytes, password: str) -> Future:
+        """ Future of is_valid(hashed_password, password)
+        """
+        return self._submit(is_valid, hashed_password, password)
+
+    def hash_many(self, passwords: Iterable[str]) -> List[bytes]:
+        """ Hashes of passwords, computed in parallel
+        """
+        futures = [self.hash(password) for password in passwords]
+        return [future.result() for future in futures]
+
+    def verify_many(self, pairs: Iterable[Tuple[bytes, str]]) -> List[bool]:
+        """ is_valid of each (hashed_password, password), in parallel
+        """
+        futures = [self.verify(hashed, password) for hashed, password in pairs]
+        return [future.result() for future in futures]
+
+    async def hash_async(self, password: str) -> bytes:
+        """ Await hash_password(password) without blocking the loop
+            (unless max_pending calls are already pending)
+        """
+        return await asyncio.wrap_future(self.hash(password))
+
+    async def verify_async(self, hashed_password: bytes,
+                           password: str) -> bool:
+        """ Await is_valid(hashed_password, password) without blocking
+            the loop (unless max_pending calls are already pending)
+        """
+        return await asyncio.wrap_future(self.verify(hashed_password,
+                                                     password))
+
+    def shutdown(self, wait: bool = True) -> None:
+        """ Stop the workers once the pending calls are done
+        """
+        self._executor.shutdown(wait)
@@ -2,12 +2,22 @@
 """
 filter_datum
 """
+from collections import deque
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing import Pool
 from typing import List
+import atexit
+import queue
 import re
 import logging
 import os
 import mysql.connector
+import resource
 import sys
+import threading
+import time
+import weakref
 
 
 patterns = {
@@ -15,6 +25,55 @@ patterns = {
         'replace': lambda x: r'\g<field>={}'.format(x)
         }
 PII_FIELDS = ('name', 'email', 'phone', 'ssn', 'password')
+USER_FIELDS = "name,email,phone,ssn,password,ip,last_login,user_agent"
+
+
+class Redactor:
+    """ Hides the values of fields in messages of key=value pairs
+        ending with separator, with a regex compiled once
+    """
+
+    def __init__(self, fields: List[str], redaction: str, separator: str):
+        extract, replace = (patterns['extract'], patterns['replace'])
+        self.regex = re.compile(extract(fields, separator))
+        self.replacement = replace(redaction)
+
+    def redact(self, message: str) -> str:
+        """ return message with the values of the fields redacted
+        """
+        return self.regex.sub(self.replacement, message)
+
+
+class TokenRedactor:
+    """ Same as Redactor without a regex: splits the message on the
+        separator once and redacts the pairs whose key is in a frozenset
+
+    A key is the last space separated word before the first = of a
+    pair, so the prefix added by a Formatter is skipped like the regex
+    does. Unlike the regex, a field name only matches as a whole key.
+    """
+
+    def __init__(self, fields: List[str], redaction: str, separator: str):
+        self.fields = frozenset(fields)
+        self.redaction = redaction
+        self.separator = separator
+
+    def redact(self, message: str) -> str:
+        """ return message with the values of the fields redacted
+        """
+        pairs = message.split(self.separator)
+        for i, pair in enumerate(pairs):
+            key, equal, _ = pair.partition('=')
+            if equal and key.rpartition(' ')[2] in self.fields:
+                pairs[i] = '{}={}'.format(key, self.redaction)
+        return self.separator.join(pairs)
+
+
+@lru_cache(maxsize=128)
+def get_redactor(fields: tuple, redaction: str, separator: str) -> Redactor:
+    """ Redactor for these arguments, compiled on first use
+    """
+    return Redactor(fields, redaction, separator)
 
 
 def filter_datum(
@@ -22,12 +81,62 @@ def filter_datum(
         ) -> str:
     """ function to hide user data
     """
-    extract, replace = (patterns['extract'], patterns['replace'])
-    return re.sub(extract(fields, separator), replace(redaction), message)
+    redactor = get_redactor(tuple(fields), redaction, separator)
+    return redactor.redact(message)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """ Hands records to a QueueListener thread through a bounded queue,
+        leaving their formatting to the listener's handlers
+
+    When the queue is full the overflow policy applies:
+     - "block": wait for room in the queue
+     - "drop": discard the record
+     - "count": discard the record and count it in self.dropped
+    """
+    OVERFLOW_POLICIES = ('block', 'drop', 'count')
 
-def get_logger() -> logging.Logger:
+    def __init__(self, maxsize: int = 10000, overflow: str = 'block'):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy {}".format(overflow))
+        super(BoundedQueueHandler, self).__init__(queue.Queue(maxsize))
+        self.overflow = overflow
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """ keep the record as is: it is formatted by the listener """
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """ put record in the queue according to the overflow policy """
+        if self.overflow == 'block':
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.overflow == 'count':
+                self.dropped += 1
+
+
+class FlushingQueueListener(QueueListener):
+    """ QueueListener whose stop waits for room in a full queue, so the
+        records already queued are all handled before it returns
+    """
+
+    def enqueue_sentinel(self) -> None:
+        """ block until the stop marker fits in the queue """
+        self.queue.put(self._sentinel)
+
+
+def get_logger(asynchronous: bool = False, maxsize: int = 10000,
+               overflow: str = 'block') -> logging.Logger:
     """Only Log upto the INFO level
      - The object returned must be named user_data
+     - asynchronous: redact and write records on a background thread,
+       the logging call only enqueues them in a queue of maxsize
+       records with the given overflow policy (see BoundedQueueHandler).
+       The queue is flushed when the interpreter exits.
     """
     logger = logging.getLogger("user_data")
     logger.setLevel(logging.INFO)
@@ -35,11 +144,154 @@ def get_logger() -> logging.Logger:
 
     stream_handler.setFormatter(RedactingFormatter(PII_FIELDS))
     logger.propagate = False
-    logger.addHandler(stream_handler)
+    if asynchronous:
+        queue_handler = BoundedQueueHandler(maxsize, overflow)
+        queue_handler.listener = FlushingQueueListener(
+                queue_handler.queue, stream_handler,
+                respect_handler_level=True)
+        queue_handler.listener.start()
+        atexit.register(queue_handler.listener.stop)
+        logger.addHandler(queue_handler)
+    else:
+        logger.addHandler(stream_handler)
     return logger
 
+
+def is_alive(conn) -> bool:
+    """ Health check of a pooled connection: ping MySQL connections,
+        run a trivial query on other DB-API connections
+    """
+    try:
+        if hasattr(conn, 'is_connected'):
+            return conn.is_connected()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        finally:
+            cursor.close()
+        return True
+    except Exception:
+        return False
+
+
+class PooledConnection:
+    """ Proxy of a connection checked out of a ConnectionPool: closing
+        it gives the connection back to the pool, as does garbage
+        collecting a proxy that wasn't closed
+    """
+
+    def __init__(self, pool: 'ConnectionPool', conn):
+        self._conn = conn
+        self._release = weakref.finalize(self, pool.release, conn)
+
+    def __getattr__(self, name: str):
+        if self._conn is None:
+            raise AttributeError("Connection returned to its pool")
+        return getattr(self._conn, name)
+
+    def __enter__(self) -> 'PooledConnection':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """ return the connection to the pool """
+        if self._conn is not None:
+            self._conn = None
+            self._release()
+
+
+class ConnectionPool:
+    """ Reuses at most size connections opened by the connect callable
+
+      - idle connections are health checked on checkout, and replaced
+        by a new one if check fails
+      - acquire blocks up to timeout seconds when all the connections
+        are checked out
+      - released connections are rolled back, so the next borrower
+        doesn't inherit an open transaction
+    """
+
+    def __init__(self, connect, size: int = 5, check=is_alive,
+                 timeout: float = None):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.connect = connect
+        self.size = size
+        self.check = check
+        self.timeout = timeout
+        self._idle = deque()
+        self._opened = 0
+        self._available = threading.Condition()
+
+    def acquire(self) -> PooledConnection:
+        """ Check out a healthy connection """
+        with self._available:
+            if not self._available.wait_for(
+                    lambda: self._idle or self._opened < self.size,
+                    self.timeout):
+                raise TimeoutError("No connection available in the pool")
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._opened += 1
+        if conn is not None and not self.check(conn):
+            # reconnect in the slot of the broken connection
+            try:
+                conn.close()
+            except Exception:
+                pass
+            conn = None
+        if conn is None:
+            try:
+                conn = self.connect()
+            except Exception:
+                with self._available:
+                    self._opened -= 1
+                    self._available.notify()
+                raise
+        return PooledConnection(self, conn)
+
+    def release(self, conn) -> None:
+        """ Give conn back to the pool, or free its slot if it can't be
+            rolled back """
+        try:
+            conn.rollback()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            with self._available:
+                self._opened -= 1
+                self._available.notify()
+            return
+        with self._available:
+            self._idle.append(conn)
+            self._available.notify()
+
+    def close(self) -> None:
+        """ Close every idle connection """
+        with self._available:
+            idle, self._idle = self._idle, deque()
+            self._opened -= len(idle)
+            self._available.notify_all()
+        for conn in idle:
+            conn.close()
+
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
 def get_db() -> mysql.connector.connection.MySQLConnection:
     """ Return a connector to a secure database
+      - connections come from a pool of PERSONAL_DATA_DB_POOL_SIZE
+        (default 5) connections: closing the connector returns it to
+        the pool instead of disconnecting
+      - waits at most PERSONAL_DATA_DB_POOL_TIMEOUT (default 30)
+        seconds for a connection, failures are logged and return None
     """
     USERNAME = os.getenv('PERSONAL_DATA_DB_USERNAME', 'root')
     PASSWORD = os.getenv('PERSONAL_DATA_DB_PASSWORD', '')
@@ -47,36 +299,145 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     NAME = os.getenv('PERSONAL_DATA_DB_NAME')
     if NAME is None:
         return
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None:
+            _db_pool = ConnectionPool(
+                    lambda: mysql.connector.connect(
+                        host=HOST,
+                        user=USERNAME,
+                        password=PASSWORD,
+                        database=NAME
+                        ),
+                    int(os.getenv('PERSONAL_DATA_DB_POOL_SIZE', 5)),
+                    timeout=float(os.getenv('PERSONAL_DATA_DB_POOL_TIMEOUT',
+                                            30)))
     try:
-        connection = mysql.connector.connect(
-                host=HOST,
-                user=USERNAME,
-                password=PASSWORD,
-                database=NAME
-                )
-        return connection
-    except Exception as e:
+        return _db_pool.acquire()
+    except Exception:
+        logging.getLogger(__name__).exception("get_db failed")
         return None
 
-def main() -> None:
-    fields = "name,email,phone,ssn,password,ip,last_login,user_agent"
-    columns = fields.split(',')
-    conn = get_db()
-    logger = get_logger()
+
+def export_users(conn, logger: logging.Logger, batch_size: int = 1000,
+                 fields: str = USER_FIELDS) -> int:
+    """ Log every row of the users table through logger
+
+      - rows are fetched batch_size at a time from an unbuffered cursor,
+        so the table is never held in memory
+      - conn can be any DB-API connection (MySQL from get_db, SQLite...)
+      - returns the number of rows logged
+    """
+    template = '{};'.format('; '.join(
+        '{}={{}}'.format(column) for column in fields.split(',')))
+    query = "SELECT {} FROM users;".format(fields)
+    count = 0
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query)
+        rows = cursor.fetchmany(batch_size)
+        while rows:
+            for row in rows:
+                args = ("user_data", logging.INFO, None, None,
+                        template.format(*row), None, None)
+                logger.handle(logging.LogRecord(*args))
+            count += len(rows)
+            rows = cursor.fetchmany(batch_size)
+    finally:
+        cursor.close()
+    return count
+
+
+_batch_formatter = None
+
+
+def _init_batch_worker(fields: str) -> None:
+    """ Build the formatter of an export worker process
+    """
+    global _batch_formatter
+    template = '{};'.format('; '.join(
+        '{}={{}}'.format(column) for column in fields.split(',')))
+    _batch_formatter = (template, RedactingFormatter(PII_FIELDS))
+
+
+def _format_batch(rows: List[tuple]) -> str:
+    """ Redacted log lines of a batch of users rows
+    """
+    template, formatter = _batch_formatter
+    lines = []
+    for row in rows:
+        args = ("user_data", logging.INFO, None, None,
+                template.format(*row), None, None)
+        lines.append(formatter.format(logging.LogRecord(*args)))
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def export_users_parallel(conn, stream=None, workers: int = 4,
+                          batch_size: int = 1000,
+                          fields: str = USER_FIELDS) -> int:
+    """ Same output as export_users with get_logger, formatted and
+        redacted by a pool of worker processes
+
+      - this process reads batches of batch_size rows and sends them to
+        the workers, then writes the formatted batches to stream
+        (stderr by default) in the order they were read
+      - at most 2 batches per worker are in flight, so memory stays
+        bounded whatever the size of the table
+      - returns the number of rows written
+    """
+    if stream is None:
+        stream = sys.stderr
     query = "SELECT {} FROM users;".format(fields)
+    count = 0
 
-    with conn.cursor() as cursor:
+    cursor = conn.cursor()
+    try:
         cursor.execute(query)
-        rows = cursor.fetchall()
-        for row in rows:
-            record = map(
-                    lambda x: '{}={}'.format(x[0], x[1]),
-                    zip(columns, row),
-                    )
-            msg = '{};'.format('; '.join(list(record)))
-            args = ("user_data", logging.INFO, None, None, msg, None, None)
-            log_record = logging.LogRecord(*args)
-            logger.handle(log_record)
+        with Pool(workers, _init_batch_worker, (fields,)) as pool:
+            pending = deque()
+            rows = cursor.fetchmany(batch_size)
+            while rows or pending:
+                if rows and len(pending) < 2 * workers:
+                    pending.append(pool.apply_async(_format_batch, (rows,)))
+                    count += len(rows)
+                    rows = cursor.fetchmany(batch_size)
+                    continue
+                stream.write(pending.popleft().get())
+                stream.flush()
+    finally:
+        cursor.close()
+    return count
+
+
+def main(conn=None, batch_size: int = 1000, workers: int = None) -> None:
+    """ Log the redacted users table then report the rows/second and
+        the peak memory of the export on stderr
+      - with more than 1 worker (PERSONAL_DATA_EXPORT_WORKERS by
+        default), rows are redacted by export_users_parallel
+    """
+    close = conn is None
+    if conn is None:
+        conn = get_db()
+    if conn is None:
+        return
+    if workers is None:
+        workers = int(os.getenv('PERSONAL_DATA_EXPORT_WORKERS', 1))
+
+    start = time.perf_counter()
+    if workers > 1:
+        count = export_users_parallel(conn, None, workers, batch_size)
+    else:
+        count = export_users(conn, get_logger(), batch_size)
+    if close:
+        conn.close()
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print("{} rows in {:.2f}s ({:.0f} rows/s), peak RSS {:.1f} MB".format(
+        count, elapsed, count / elapsed if elapsed else 0, peak),
+        file=sys.stderr)
 
 
 class RedactingFormatter(logging.Formatter):
@@ -87,14 +448,18 @@ class RedactingFormatter(logging.Formatter):
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
     SEPARATOR = ";"
 
-    def __init__(self, fields: List[str] = []):
+    def __init__(self, fields: List[str] = [],
+                 redactor_class: type = Redactor):
+        """ redactor_class is Redactor (regex) or TokenRedactor
+        """
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.redactor = redactor_class(fields, self.REDACTION, self.SEPARATOR)
 
     def format(self, record: logging.LogRecord) -> str:
-        """ format the incoming logs using filter_datum"""
+        """ format the incoming logs, redacted like filter_datum"""
         msg = super(RedactingFormatter, self).format(record)
-        return filter_datum(self.fields, self.REDACTION, msg, self.SEPARATOR)
+        return self.redactor.redact(msg)
 
 
 
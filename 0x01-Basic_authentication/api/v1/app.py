@@ -12,6 +12,8 @@ import os
 app = Flask(__name__)
 app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
+EXCLUDED_PATHS = ('/api/v1/status/', '/api/v1/unauthorized/',
+                  '/api/v1/forbidden/')
 auth = None
 env_var = getenv('AUTH_TYPE')
 if env_var == 'auth':
@@ -25,15 +27,19 @@ elif env_var == 'basic_auth':
 def before_request() -> str:
     """ Checker function for authorization
         to be executed before every request
+
+    The user is resolved once per request and stored in
+    request.current_user for the views
     """
+    request.current_user = None
     if auth is None:
         return
-    path_list = ['/api/v1/status/', '/api/v1/unauthorized/', '/api/v1/forbidden/']
-    if auth.require_auth(request.path, path_list) is False:
+    if auth.require_auth(request.path, EXCLUDED_PATHS) is False:
         return
     if auth.authorization_header(request) is None:
         abort(401)
-    if auth.current_user(request) is None:
+    request.current_user = auth.current_user(request)
+    if request.current_user is None:
         abort(403)
 
 @app.errorhandler(404)
@@ -1,9 +1,27 @@
 #!/usr/bin/env python3
 """ Auth class """
 from flask import request
+from functools import lru_cache
 from typing import List, TypeVar
+import re
 
 
+@lru_cache(maxsize=32)
+def compile_excluded_paths(excluded_paths: tuple) -> re.Pattern:
+    """ Compile excluded paths into one regex matching a path ending
+        with a / if it is excluded
+      - a path matches with or without its trailing /
+      - a path ending with * matches every path starting with the
+        part before the *
+    """
+    patterns = []
+    for excluded in excluded_paths:
+        if excluded.endswith('*'):
+            patterns.append(re.escape(excluded[:-1]) + '.*')
+        else:
+            patterns.append(re.escape(excluded.rstrip('/')) + '/')
+    return re.compile('|'.join(patterns))
+
 
 class Auth:
     """ Template for authentication systems
@@ -11,14 +29,25 @@ class Auth:
     def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
         """ Returns True if path is not in the list of paths excluded_paths
         otherwise returns False
+          - excluded paths can end with * to exclude every path
+            starting with what precedes it
+          - the compiled paths are cached by their content, and the
+            last tuple given is also remembered by identity to skip
+            hashing it again on every request
         """
-        if path is None or excluded_paths is None or excluded_paths == []:
+        if path is None or not excluded_paths:
             return True
         if path[-1] != '/':
             path = path + '/'
-        if path not in excluded_paths:
-            return True
-        return False
+        compiled = getattr(self, '_compiled_excluded_paths', None)
+        if compiled is not None and compiled[0] is excluded_paths:
+            pattern = compiled[1]
+        else:
+            pattern = compile_excluded_paths(tuple(excluded_paths))
+            if type(excluded_paths) is tuple:
+                # a tuple can't change: its pattern can be reused as is
+                self._compiled_excluded_paths = (excluded_paths, pattern)
+        return pattern.fullmatch(path) is None
 
     def authorization_header(self, request=None) -> str:
         """ returns the value of the request header authorization
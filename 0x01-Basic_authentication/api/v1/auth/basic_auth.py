@@ -1,14 +1,34 @@
 #!/usr/bin/env python3
 """ BasicAuth class"""
 import base64
+import hashlib
+import threading
 from api.v1.auth.auth import Auth
+from collections import OrderedDict
 from models.user import User
+from os import getenv
 from typing import TypeVar
 
 
 class BasicAuth(Auth):
     """ class to handle basic authentication
+
+    Headers whose credentials were verified are remembered in a LRU
+    cache of at most BASIC_AUTH_CACHE_SIZE entries, keyed on the SHA256
+    of the header. A hit only costs a User.get: the entry is dropped as
+    soon as the user is removed or its email or password hash changed.
     """
+
+    def __init__(self):
+        """ Initialize the credentials cache
+        """
+        try:
+            self.cache_size = int(getenv('BASIC_AUTH_CACHE_SIZE', 1024))
+        except ValueError:
+            self.cache_size = 1024
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
     def extract_base64_authorization_header(
             self, authorization_header: str) -> str:
         """ Get the Base64 part of the authorization header for
@@ -74,9 +94,48 @@ class BasicAuth(Auth):
         if user[0].is_valid_password(user_pwd):
             return user[0]
 
+    def cached_user(self, key: str) -> TypeVar('User'):
+        """ Return the user verified for the header digest key if its
+            email and password are unchanged since, otherwise None
+        """
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            self._cache.move_to_end(key)
+        user_id, email, password = entry
+        user = User.get(user_id)
+        if user is None or user.email != email or user.password != password:
+            with self._cache_lock:
+                self._cache.pop(key, None)
+            return None
+        return user
+
+    def cache_user(self, key: str, user: TypeVar('User')):
+        """ Remember that the header digest key authenticates user
+        """
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = (user.id, user.email, user.password)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
     def current_user(self, request=None) -> TypeVar('User'):
+        """ Returns the User authenticated by the Authorization header
+        """
         auth_header = self.authorization_header(request)
+        if auth_header is None:
+            return None
+        key = hashlib.sha256(auth_header.encode('utf-8')).hexdigest()
+        user = self.cached_user(key)
+        if user is not None:
+            return user
         extracted_header = self.extract_base64_authorization_header(auth_header)
         decoded_header = self.decode_base64_authorization_header(extracted_header)
         user_email, password = self.extract_user_credentials(decoded_header)
-        return self.user_object_from_credentials(user_email, password)
+        user = self.user_object_from_credentials(user_email, password)
+        if user is not None:
+            self.cache_user(key, user)
+        return user
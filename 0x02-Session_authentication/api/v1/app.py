@@ -12,6 +12,12 @@ import os
 app = Flask(__name__)
 app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
+EXCLUDED_PATHS = (
+    "/api/v1/status/",
+    "/api/v1/unauthorized/",
+    "/api/v1/forbidden/",
+    "/api/v1/auth_session/login/",
+)
 auth = None
 env_var = getenv('AUTH_TYPE')
 if env_var == 'auth':
@@ -28,33 +34,18 @@ elif env_var == 'session_auth':
 def before_request() -> str:
     """ Checker function for authorization
         to be executed before every request
-    """
-    # if auth is None:
-        # return
-    # path_list = ['/api/v1/status/', '/api/v1/unauthorized/',
-                 # '/api/v1/forbidden/', '/api/v1/auth_session/login/']
-    # if auth.require_auth(request.path, path_list) is False:
-        # return
-    # if auth.authorization_header(request) is None:
-        # abort(401)
-    # if auth.current_user(request) is None:
-        # abort(403)
-    # if auth.session_cookie(request) is None:
-        # abort(401)
-    # request.current_user = auth.current_user(request)
 
+    The user is resolved once per request and stored in
+    request.current_user for the views. The credentials are checked
+    cheapest first: session cookie, then Authorization header.
+    """
+    request.current_user = None
     if auth:
-        excluded_paths = [
-            "/api/v1/status/",
-            "/api/v1/unauthorized/",
-            "/api/v1/forbidden/",
-            "/api/v1/auth_session/login/",
-        ]
-        if auth.require_auth(request.path, excluded_paths):
-            user = auth.current_user(request)
-            if auth.authorization_header(request) is None and \
-                    auth.session_cookie(request) is None:
+        if auth.require_auth(request.path, EXCLUDED_PATHS):
+            if auth.session_cookie(request) is None and \
+                    auth.authorization_header(request) is None:
                 abort(401)
+            user = auth.current_user(request)
             if user is None:
                 abort(403)
             request.current_user = user
@@ -1,22 +1,51 @@
 #!/usr/bin/env python3
 """ SessionAuth class"""
 from api.v1.auth.auth import Auth
+from api.v1.auth.session_store import (
+    SessionStore, MemorySessionStore, SQLiteSessionStore)
+from os import getenv
 from uuid import uuid4
 from models.user import User
 
 
 class SessionAuth(Auth):
     """ Define functions that implement session authentication
+
+    Sessions live in a SessionStore: with SESSION_STORE=sqlite they are
+    shared by every worker process, otherwise they are kept in the
+    user_id_by_session_id dict of the current process.
+    They expire SESSION_DURATION seconds after their creation, never if
+    it is missing or not a positive integer.
     """
     user_id_by_session_id = {}
 
+    def __init__(self, store: SessionStore = None):
+        """ Initialize the session store
+        """
+        if store is None:
+            try:
+                duration = int(getenv('SESSION_DURATION', 0))
+            except ValueError:
+                duration = 0
+            if getenv('SESSION_STORE') == 'sqlite':
+                store = SQLiteSessionStore(duration=duration)
+            else:
+                store = MemorySessionStore(self.user_id_by_session_id,
+                                           duration)
+        self.store = store
+
+    def session_count(self) -> int:
+        """ Number of live sessions
+        """
+        return self.store.count()
+
     def create_session(self, user_id: str = None) -> str:
         """ Create a new session id for the user
         """
         if user_id is None or type(user_id) is not str:
             return None
         iden = str(uuid4())
-        self.user_id_by_session_id[iden] = user_id
+        self.store.set(iden, user_id)
         return iden
 
     def user_id_for_session_id(self, session_id: str = None) -> str:
@@ -24,7 +53,7 @@ class SessionAuth(Auth):
         """
         if session_id is None or type(session_id) is not str:
             return None
-        return self.user_id_by_session_id.get(session_id)
+        return self.store.get(session_id)
 
     def current_user(self, request=None):
         """ Returns a User instance based on a cookie value
@@ -44,9 +73,5 @@ class SessionAuth(Auth):
             return False
         cookie = self.session_cookie(request)
         if cookie:
-            user_id = self.user_id_for_session_id(cookie)
-            if user_id is None:
-                return False
-            del self.user_id_by_session_id[cookie]
-            return True
+            return self.store.delete(cookie)
         return False
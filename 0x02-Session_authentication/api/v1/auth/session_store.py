@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+""" Session stores used by SessionAuth
+"""
+from abc import ABC, abstractmethod
+from collections import deque
+from os import getenv
+import sqlite3
+import threading
+import time
+
+
+class SessionStore(ABC):
+    """ Maps session ids to user ids
+
+    With a duration (in seconds) greater than 0, sessions expire that
+    long after their creation. Every session lives for the same
+    duration, so they expire in creation order and expired ones can be
+    evicted from the oldest end without looking at the live ones.
+    """
+    duration = 0
+
+    @abstractmethod
+    def set(self, session_id: str, user_id: str):
+        """ Attach session_id to user_id
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, session_id: str) -> str:
+        """ Return the user id of session_id, or None
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """ Forget session_id, return False if it didn't exist
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self) -> int:
+        """ Number of live sessions
+        """
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """ Sessions kept in a dict of the current process
+
+    Expiry times are queued in creation order: each call evicts the
+    expired sessions at the head of the queue, so eviction costs O(1)
+    per session. Logged out sessions stay in the queue until they would
+    have expired and are skipped then.
+    """
+
+    def __init__(self, sessions: dict = None, duration: int = 0):
+        """ Initialize the store on the sessions dict
+        """
+        self.sessions = {} if sessions is None else sessions
+        self.duration = duration
+        self.created_at = {}
+        self._expiries = deque()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        """ Drop the sessions expired at now
+        """
+        if self.duration <= 0:
+            return
+        with self._lock:
+            while self._expiries and self._expiries[0][0] <= now:
+                expires_at, session_id = self._expiries.popleft()
+                created_at = self.created_at.get(session_id)
+                if created_at is not None and \
+                        created_at + self.duration == expires_at:
+                    del self.created_at[session_id]
+                    self.sessions.pop(session_id, None)
+
+    def set(self, session_id: str, user_id: str):
+        """ Attach session_id to user_id
+        """
+        now = time.time()
+        self._evict(now)
+        self.sessions[session_id] = user_id
+        if self.duration > 0:
+            with self._lock:
+                self.created_at[session_id] = now
+                self._expiries.append((now + self.duration, session_id))
+
+    def get(self, session_id: str) -> str:
+        """ Return the user id of session_id, or None
+        """
+        self._evict(time.time())
+        return self.sessions.get(session_id)
+
+    def delete(self, session_id: str) -> bool:
+        """ Forget session_id, return False if it didn't exist
+            (under the lock, not to race with _evict)
+        """
+        with self._lock:
+            self.created_at.pop(session_id, None)
+            return self.sessions.pop(session_id, None) is not None
+
+    def count(self) -> int:
+        """ Number of live sessions
+        """
+        self._evict(time.time())
+        return len(self.sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """ Sessions kept in an SQLite database shared by every process
+        opening the same file
+
+    The database runs in WAL mode so lookups don't wait for writers,
+    and every thread gets its own connection.
+    Sessions are indexed on their creation time: lookups ignore expired
+    ones and, at most every EVICTION_INTERVAL seconds, a range delete on
+    that index removes them.
+    """
+    EVICTION_INTERVAL = 60
+
+    def __init__(self, db_path: str = None, duration: int = 0):
+        """ Initialize the store on the database file db_path
+        """
+        if db_path is None:
+            db_path = getenv('SESSION_DB_PATH', '.db_sessions.sqlite')
+        self._db_path = db_path
+        self.duration = duration
+        self._evicted_at = 0
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(session_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, "
+            "created_at REAL NOT NULL DEFAULT 0)")
+        columns = [row[1] for row in
+                   connection.execute("PRAGMA table_info(sessions)")]
+        if 'created_at' not in columns:
+            connection.execute("ALTER TABLE sessions ADD COLUMN "
+                               "created_at REAL NOT NULL DEFAULT 0")
+        connection.execute("CREATE INDEX IF NOT EXISTS ix_sessions_created_at "
+                           "ON sessions (created_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """ Connection of the current thread
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self._db_path, timeout=30,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _oldest_live(self, now: float) -> float:
+        """ Creation time under which sessions are expired
+        """
+        if self.duration <= 0:
+            return float('-inf')
+        return now - self.duration
+
+    def _evict(self, now: float):
+        """ Delete the expired sessions if the last eviction is older
+            than EVICTION_INTERVAL
+        """
+        if self.duration <= 0 or now - self._evicted_at < \
+                self.EVICTION_INTERVAL:
+            return
+        self._evicted_at = now
+        self._connection().execute(
+            "DELETE FROM sessions WHERE created_at <= ?",
+            (self._oldest_live(now),))
+
+    def set(self, session_id: str, user_id: str):
+        """ Attach session_id to user_id
+        """
+        now = time.time()
+        self._evict(now)
+        self._connection().execute(
+            "INSERT OR REPLACE INTO sessions (session_id, user_id, "
+            "created_at) VALUES (?, ?, ?)", (session_id, user_id, now))
+
+    def get(self, session_id: str) -> str:
+        """ Return the user id of session_id, or None
+        """
+        row = self._connection().execute(
+            "SELECT user_id FROM sessions "
+            "WHERE session_id = ? AND created_at > ?",
+            (session_id, self._oldest_live(time.time()))).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def delete(self, session_id: str) -> bool:
+        """ Forget session_id, return False if it didn't exist
+        """
+        cursor = self._connection().execute(
+            "DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def count(self) -> int:
+        """ Number of live sessions
+        """
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM sessions WHERE created_at > ?",
+            (self._oldest_live(time.time()),)).fetchone()[0]
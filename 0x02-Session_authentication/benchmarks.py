@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+""" Benchmarks for the models and authentication layers
+
+Usage:
+    ./benchmarks.py <name> [args...]
+"""
+from datetime import datetime
+from multiprocessing import Pool
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from api.v1.auth.auth import Auth
+from api.v1.auth.session_store import SQLiteSessionStore
+from models.base import TIMESTAMP_FORMAT
+from models.user import User
+
+
+class DictUser():
+    """ Stand-in for a User storing its attributes in a __dict__,
+        as every model did before __slots__
+    """
+
+    def __init__(self, **kwargs: dict):
+        """ Initialize a DictUser with the attributes of a User
+        """
+        self.__dict__.update(kwargs)
+
+
+def _user_attributes(i: int) -> dict:
+    """ Attributes of the i-th generated user
+    """
+    return {
+        'id': str(uuid.uuid4()),
+        'created_at': datetime.utcnow(),
+        'updated_at': datetime.utcnow(),
+        'email': "user{}@hbtn.io".format(i),
+        '_password': uuid.uuid4().hex * 2,
+        'first_name': "First{}".format(i),
+        'last_name': "Last{}".format(i),
+    }
+
+
+def _measure(factory, count: int) -> int:
+    """ Bytes allocated to keep count objects built by factory alive
+    """
+    attributes = [_user_attributes(i) for i in range(count)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = [factory(attrs) for attrs in attributes]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objs
+    return after - before
+
+
+def _slotted_user(attributes: dict) -> User:
+    """ Build a User holding the given attributes
+    """
+    user = User.__new__(User)
+    for key, value in attributes.items():
+        setattr(user, key, value)
+    return user
+
+
+def bench_memory(count: str = "100000") -> None:
+    """ Compare the memory used by count dict based and slotted users
+    """
+    count = int(count)
+    legacy = _measure(lambda attrs: DictUser(**attrs), count)
+    compact = _measure(_slotted_user, count)
+    print("{} users".format(count))
+    print("  __dict__:  {:>8.1f} MB  {:>4} bytes/user".format(
+        legacy / 1e6, legacy // count))
+    print("  __slots__: {:>8.1f} MB  {:>4} bytes/user".format(
+        compact / 1e6, compact // count))
+    print("  saved:     {:>7.1f} %".format(100 * (1 - compact / legacy)))
+
+
+def _session_worker(args: tuple) -> int:
+    """ Create sessions and look each of them up 3 times
+    """
+    db_path, count = args
+    store = SQLiteSessionStore(db_path)
+    for i in range(count):
+        session_id = str(uuid.uuid4())
+        store.set(session_id, "user{}".format(i))
+        for _ in range(3):
+            store.get(session_id)
+    return count * 4
+
+
+def bench_sessions(count: str = "5000") -> None:
+    """ Throughput of the shared session store with 1/2/4/8 processes,
+        each doing count session creations and 3 * count lookups
+    """
+    count = int(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in (1, 2, 4, 8):
+            db_path = os.path.join(tmp, "sessions_{}.sqlite".format(workers))
+            SQLiteSessionStore(db_path)
+            with Pool(workers) as pool:
+                start = time.perf_counter()
+                ops = sum(pool.map(_session_worker,
+                                   [(db_path, count)] * workers))
+                elapsed = time.perf_counter() - start
+            print("{} workers: {:>9.0f} ops/s".format(workers, ops / elapsed))
+
+
+def _write_user_snapshot(count: int) -> None:
+    """ Write a .db_User.json of count users in the current directory,
+        one user at a time
+    """
+    with open(".db_User.json", 'w') as f:
+        f.write('{')
+        for i in range(count):
+            attributes = _user_attributes(i)
+            for key in ('created_at', 'updated_at'):
+                attributes[key] = attributes[key].strftime(TIMESTAMP_FORMAT)
+            f.write('{}{}: {}'.format(', ' if i else '',
+                                      json.dumps(attributes['id']),
+                                      json.dumps(attributes)))
+        f.write('}')
+
+
+def _load_worker(directory: str) -> tuple:
+    """ Load the users of directory, then look at every one of them
+        (as GET /api/v1/users does) and load them again traced
+    """
+    os.chdir(directory)
+    start = time.perf_counter()
+    User.load_from_file()
+    loaded = time.perf_counter() - start
+    start = time.perf_counter()
+    User.all()
+    searched = time.perf_counter() - start
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    tracemalloc.start()
+    User.load_from_file()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return loaded, searched, current, peak, maxrss
+
+
+def bench_load(count: str = "100000") -> None:
+    """ Time and memory of User.load_from_file on a snapshot of count
+        users, measured in a fresh process
+    """
+    count = int(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            _write_user_snapshot(count)
+            size = os.path.getsize(".db_User.json")
+        finally:
+            os.chdir(cwd)
+        with Pool(1) as pool:
+            loaded, searched, current, peak, maxrss = pool.apply(
+                _load_worker, (tmp,))
+    print("{} users, {:.1f} MB snapshot".format(count, size / 1e6))
+    print("  load:        {:>8.2f} s".format(loaded))
+    print("  first all(): {:>8.2f} s".format(searched))
+    print("  traced:      {:>8.1f} MB  peak {:.1f} MB".format(
+        current / 1e6, peak / 1e6))
+    print("  maxrss:      {:>8.1f} MB".format(maxrss / 1e6))
+
+
+def _linear_require_auth(path: str, excluded_paths: list) -> bool:
+    """ Auth.require_auth as it was before excluded paths were compiled
+    """
+    if path is None or excluded_paths is None or excluded_paths == []:
+        return True
+    if path[-1] != '/':
+        path = path + '/'
+    if path not in excluded_paths:
+        return True
+    return False
+
+
+def bench_require_auth(count: str = "50", rounds: str = "200000") -> None:
+    """ Time require_auth on count excluded paths: linear list lookup
+        rebuilt on every request against the compiled matcher
+    """
+    count, rounds = int(count), int(rounds)
+    excluded = tuple("/api/v1/public{}/".format(i) for i in range(count))
+    paths = ["/api/v1/users", "/api/v1/public{}".format(count - 1)]
+    auth = Auth()
+
+    start = time.perf_counter()
+    for i in range(rounds):
+        _linear_require_auth(paths[i % 2], list(excluded))
+    linear = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(rounds):
+        auth.require_auth(paths[i % 2], excluded)
+    compiled = time.perf_counter() - start
+
+    print("{} excluded paths, {} calls".format(count, rounds))
+    print("  linear:   {:>9.0f} calls/s".format(rounds / linear))
+    print("  compiled: {:>9.0f} calls/s".format(rounds / compiled))
+
+
+BENCHMARKS = {
+    'memory': bench_memory,
+    'load': bench_load,
+    'sessions': bench_sessions,
+    'require_auth': bench_require_auth,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print("Usage: {} <{}> [args...]".format(
+            sys.argv[0], "|".join(BENCHMARKS)))
+        sys.exit(1)
+    BENCHMARKS[sys.argv[1]](*sys.argv[2:])
@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+""" Select the storage engine of the models from STORAGE_TYPE
+"""
+from os import getenv
+
+
+if getenv('STORAGE_TYPE') == 'sqlite':
+    from models.engine.db_storage import SQLiteStorage
+    storage = SQLiteStorage()
+else:
+    from models.engine.file_storage import FileStorage
+    storage = FileStorage()
@@ -3,35 +3,57 @@
 """
 from datetime import datetime
 from typing import TypeVar, List, Iterable
-from os import path
-import json
 import uuid
 
+from models import storage
+
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
-DATA = {}
 
 
 class Base():
     """ Base class
+
+    Objects are stored by the engine selected in models/__init__.py
+    (see models/engine), every class method below delegates to it.
+
+    Subclasses can declare secondary indexes on attributes:
+      - `_indexes`: attributes the engine indexes so that equality
+        searches on them don't scan every object
+      - `_unique_indexes`: indexed attributes whose (non None) value
+        can only be saved on one object
+
+    Base stores its own attributes in __slots__: a subclass declaring
+    __slots__ for its attributes too has no per-instance __dict__,
+    which makes each instance several times smaller. Subclasses that
+    don't declare __slots__ keep a regular __dict__.
     """
+    __slots__ = ('id', 'created_at', 'updated_at')
+    _slot_fields = __slots__
+    _indexes = ()
+    _unique_indexes = ()
+
+    def __init_subclass__(cls, **kwargs):
+        """ Collect the slot attributes of the whole class hierarchy
+        """
+        super().__init_subclass__(**kwargs)
+        cls._slot_fields = tuple(
+                name for klass in reversed(cls.__mro__)
+                for name in klass.__dict__.get('__slots__', ())
+                if name not in ('__dict__', '__weakref__'))
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
-        s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
-
-        self.id = kwargs.get('id', str(uuid.uuid4()))
+        self.id = kwargs['id'] if 'id' in kwargs else str(uuid.uuid4())
+        # TIMESTAMP_FORMAT is ISO 8601, fromisoformat parses it much
+        # faster than strptime
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = datetime.fromisoformat(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = datetime.fromisoformat(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
@@ -47,8 +69,14 @@ class Base():
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
+        attributes = {}
+        for key in self.__class__._slot_fields:
+            if hasattr(self, key):
+                attributes[key] = getattr(self, key)
+        attributes.update(getattr(self, '__dict__', {}))
+
         result = {}
-        for key, value in self.__dict__.items():
+        for key, value in attributes.items():
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -58,55 +86,41 @@ class Base():
         return result
 
     @classmethod
-    def load_from_file(cls):
-        """ Load all objects from file
+    def _index_names(cls) -> tuple:
+        """ All indexed attributes of the class
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+        names = tuple(cls._indexes)
+        return names + tuple(n for n in cls._unique_indexes
+                             if n not in names)
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    @classmethod
+    def load_from_file(cls):
+        """ Load all objects from the storage
+        """
+        storage.load(cls)
 
     @classmethod
     def save_to_file(cls):
-        """ Save all objects to file
+        """ Save all objects to the storage
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
-
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        storage.save_all(cls)
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        storage.save(self)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        storage.remove(self)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return storage.count(cls)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -118,20 +132,10 @@ class Base():
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return storage.get(cls, id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
         """
-        s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True 
-
-        return list(filter(_search, DATA[s_class].values()))
+        return storage.search(cls, attributes)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+""" SQLiteStorage module
+"""
+from typing import TypeVar, List
+from os import getenv
+import json
+import sqlite3
+import threading
+
+from models.engine.storage import Storage, matches
+
+
+SQLITE_DB_PATH = getenv('SQLITE_DB_PATH', '.db.sqlite')
+
+
+def _quote(name: str) -> str:
+    """ Quote an SQL identifier
+    """
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+class SQLiteStorage(Storage):
+    """ Stores each class in a table of an SQLite database so that
+        several processes can serve the same objects
+
+    Rows hold the JSON of the object plus one column per `_indexes` /
+    `_unique_indexes` attribute, with a (unique) index on it.
+    The database runs in WAL mode so readers don't block the writer,
+    every thread gets its own connection and statements are built once
+    per class and run with parameters, so sqlite3 keeps them prepared.
+    """
+
+    def __init__(self, db_path: str = SQLITE_DB_PATH):
+        """ Initialize the storage on the database file db_path
+        """
+        self._db_path = db_path
+        self._local = threading.local()
+        self._statements = {}
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """ Connection of the current thread
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self._db_path, timeout=30,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _sql(self, cls: type) -> dict:
+        """ Statements of cls, creating its table and indexes on first use
+        """
+        s_class = cls.__name__
+        statements = self._statements.get(s_class)
+        if statements is not None:
+            return statements
+
+        with self._lock:
+            table = _quote(s_class)
+            names = cls._index_names()
+            columns = ''.join(", {}".format(_quote(n)) for n in names)
+            connection = self._connection()
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS {} "
+                "(id TEXT PRIMARY KEY, data TEXT NOT NULL{})".format(
+                    table, columns))
+            for name in names:
+                connection.execute(
+                    "CREATE {}INDEX IF NOT EXISTS {} ON {} ({})".format(
+                        "UNIQUE " if name in cls._unique_indexes else "",
+                        _quote("ix_{}_{}".format(s_class, name)),
+                        table, _quote(name)))
+
+            updates = ''.join(", {0} = excluded.{0}".format(_quote(n))
+                              for n in names)
+            statements = {
+                'names': names,
+                'table': table,
+                'save': "INSERT INTO {} (id, data{}) VALUES (?, ?{}) "
+                        "ON CONFLICT(id) DO UPDATE SET "
+                        "data = excluded.data{}".format(
+                            table, columns, ", ?" * len(names), updates),
+                'remove': "DELETE FROM {} WHERE id = ?".format(table),
+                'count': "SELECT COUNT(*) FROM {}".format(table),
+                'get': "SELECT data FROM {} WHERE id = ?".format(table),
+                'all': "SELECT data FROM {} ORDER BY rowid".format(table),
+            }
+            self._statements[s_class] = statements
+        return statements
+
+    def load(self, cls: type):
+        """ Create the table of cls if needed
+        """
+        self._sql(cls)
+
+    def save_all(self, cls: type):
+        """ Nothing to flush: every save is committed right away
+        """
+        pass
+
+    def save(self, obj: TypeVar('Base')):
+        """ Insert or update obj
+        """
+        sql = self._sql(obj.__class__)
+        obj_json = obj.to_json(True)
+        params = [obj.id, json.dumps(obj_json)]
+        params.extend(obj_json.get(name) for name in sql['names'])
+        try:
+            self._connection().execute(sql['save'], params)
+        except sqlite3.IntegrityError as e:
+            for name in obj.__class__._unique_indexes:
+                if "{}.{}".format(obj.__class__.__name__, name) in str(e):
+                    raise ValueError("{} {} already exists".format(
+                        name, obj_json.get(name)))
+            raise ValueError(str(e))
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete obj
+        """
+        sql = self._sql(obj.__class__)
+        self._connection().execute(sql['remove'], (obj.id,))
+
+    def count(self, cls: type) -> int:
+        """ Number of rows of cls
+        """
+        sql = self._sql(cls)
+        return self._connection().execute(sql['count']).fetchone()[0]
+
+    def get(self, cls: type, id: str) -> TypeVar('Base'):
+        """ Return one object of cls by ID
+        """
+        sql = self._sql(cls)
+        row = self._connection().execute(sql['get'], (id,)).fetchone()
+        if row is None:
+            return None
+        return cls(**json.loads(row[0]))
+
+    def search(self, cls: type, attributes: dict = {}
+               ) -> List[TypeVar('Base')]:
+        """ Search all objects of cls with matching attributes
+
+        Indexed attributes are filtered by SQLite, the remaining ones
+        are checked on the returned objects
+        """
+        sql = self._sql(cls)
+        where = []
+        params = []
+        for k, v in attributes.items():
+            if k not in sql['names']:
+                continue
+            if v is None:
+                where.append("{} IS NULL".format(_quote(k)))
+            else:
+                where.append("{} = ?".format(_quote(k)))
+                params.append(v)
+        if where:
+            query = "SELECT data FROM {} WHERE {} ORDER BY rowid".format(
+                sql['table'], " AND ".join(where))
+        else:
+            query = sql['all']
+
+        objs = []
+        for row in self._connection().execute(query, params):
+            obj = cls(**json.loads(row[0]))
+            if matches(obj, attributes):
+                objs.append(obj)
+        return objs
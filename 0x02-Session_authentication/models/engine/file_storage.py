@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+""" FileStorage module
+"""
+from contextlib import contextmanager
+from typing import TypeVar, List, Iterable
+from os import getenv, path
+import fcntl
+import json
+import os
+import re
+import threading
+
+from models.engine.storage import Storage, matches
+
+
+DATA = {}
+INDEXES = {}
+INDEXED_VALUES = {}
+
+# "file" rewrites .db_<Class>.json on every save/remove, "journal" appends
+# one record per save/remove to .db_<Class>.journal and only rewrites the
+# snapshot once JOURNAL_COMPACT_THRESHOLD records have been appended.
+# In journal mode the files of a class are also guarded by an flock on
+# .db_<Class>.lock, so that several processes can share them
+PERSISTENCE = getenv('PERSISTENCE', 'file')
+JOURNAL_COMPACT_THRESHOLD = int(getenv('JOURNAL_COMPACT_THRESHOLD', '1000'))
+JOURNAL_SIZES = {}
+FILE_LOCK = threading.RLock()
+LOCK_FDS = {}
+WHITESPACE = re.compile(r'\s*')
+
+
+def iter_json_object(f, chunk_size: int = 1 << 16) -> Iterable[tuple]:
+    """ Yield the (key, value) pairs of the JSON object stored in the
+        file f one at a time, reading it by chunks of chunk_size
+        characters instead of loading the whole document
+    """
+    decoder = json.JSONDecoder()
+    buf = f.read(chunk_size)
+    pos = WHITESPACE.match(buf).end()
+    if buf[pos:pos + 1] != '{':
+        raise ValueError("{} is not a JSON object".format(f.name))
+    pos += 1
+    eof = False
+    while True:
+        start = pos
+        try:
+            pos = WHITESPACE.match(buf, pos).end()
+            if buf[pos:pos + 1] == '}':
+                return
+            key, pos = decoder.raw_decode(buf, pos)
+            pos = WHITESPACE.match(buf, pos).end()
+            if buf[pos:pos + 1] != ':':
+                raise ValueError("Expected ':'")
+            pos = WHITESPACE.match(buf, pos + 1).end()
+            value, pos = decoder.raw_decode(buf, pos)
+            pos = WHITESPACE.match(buf, pos).end()
+            separator = buf[pos:pos + 1]
+            if separator not in (',', '}'):
+                raise ValueError("Expected ',' or '}'")
+        except ValueError:
+            # the item runs past the end of the buffer: read some more
+            if eof:
+                raise ValueError("Truncated JSON object in {}".format(f.name))
+            chunk = f.read(chunk_size)
+            eof = chunk == ''
+            buf = buf[start:] + chunk
+            pos = 0
+            continue
+        yield key, value
+        if separator == '}':
+            return
+        pos += 1
+
+
+@contextmanager
+def files_lock(s_class: str):
+    """ Hold FILE_LOCK and, in journal mode, an exclusive flock on
+        .db_<s_class>.lock (reentrant)
+    """
+    with FILE_LOCK:
+        if PERSISTENCE != 'journal' or s_class in LOCK_FDS:
+            yield
+            return
+        fd = os.open(".db_{}.lock".format(s_class), os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            LOCK_FDS[s_class] = fd
+            yield
+        finally:
+            LOCK_FDS.pop(s_class, None)
+            os.close(fd)
+
+
+def iter_journal(journal_path: str) -> Iterable[dict]:
+    """ Yield the save/remove records of a journal, skipping a torn
+        write at its end
+    """
+    with open(journal_path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('op') in ('save', 'remove'):
+                yield record
+
+
+class FileStorage(Storage):
+    """ Keeps every object in the module-global DATA dict and persists
+        each class to .db_<Class>.json
+
+    Objects are instantiated as the file is parsed, so DATA only holds
+    instances, which are smaller than their JSON dictionary (__slots__).
+    The `_indexes` and `_unique_indexes` of a class are kept as
+    value -> id maps so that equality searches on them don't scan
+    every object: a value held by several objects maps to the set of
+    their ids instead. The values each object is indexed under are
+    kept as a tuple in INDEXED_VALUES, to unindex it once modified.
+    """
+
+    def _data(self, cls: type) -> dict:
+        """ Objects of cls by id, creating the empty tables on first use
+        """
+        s_class = cls.__name__
+        if DATA.get(s_class) is None:
+            DATA[s_class] = {}
+            self._reset_indexes(cls)
+        return DATA[s_class]
+
+    def _reset_indexes(self, cls: type):
+        """ Empty the secondary indexes of cls
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {name: {} for name in cls._index_names()}
+        INDEXED_VALUES[s_class] = {}
+
+    def _index_ids(self, s_class: str, name: str, value) -> Iterable[str]:
+        """ Ids of the objects indexed under value in the index name,
+            raises a TypeError if value isn't hashable
+        """
+        ids = INDEXES[s_class][name].get(value)
+        if ids is None:
+            return ()
+        if type(ids) is set:
+            return ids
+        return (ids,)
+
+    def _index_add(self, cls: type, obj_id: str, obj):
+        """ Reference obj_id in every secondary index with the current
+            values of obj
+        """
+        s_class = cls.__name__
+        names = cls._index_names()
+        values = tuple(getattr(obj, name, None) for name in names)
+        for name, value in zip(names, values):
+            index = INDEXES[s_class][name]
+            try:
+                ids = index.get(value)
+            except TypeError:
+                continue
+            if ids is None:
+                index[value] = obj_id
+            elif type(ids) is set:
+                ids.add(obj_id)
+            elif ids != obj_id:
+                index[value] = {ids, obj_id}
+        INDEXED_VALUES[s_class][obj_id] = values
+
+    def _index_discard(self, cls: type, obj_id: str):
+        """ Drop obj_id from every secondary index
+        """
+        s_class = cls.__name__
+        values = INDEXED_VALUES[s_class].pop(obj_id, None)
+        if values is None:
+            return
+        for name, value in zip(cls._index_names(), values):
+            index = INDEXES[s_class][name]
+            try:
+                ids = index.get(value)
+            except TypeError:
+                continue
+            if type(ids) is set:
+                ids.discard(obj_id)
+                if len(ids) == 1:
+                    index[value] = ids.pop()
+            elif ids == obj_id:
+                del index[value]
+
+    def _check_unique(self, obj: TypeVar('Base')):
+        """ Raise a ValueError if another saved object already holds
+            the value of one of the unique attributes of obj
+        """
+        s_class = obj.__class__.__name__
+        for name in obj.__class__._unique_indexes:
+            value = getattr(obj, name, None)
+            if value is None:
+                continue
+            try:
+                ids = self._index_ids(s_class, name, value)
+            except TypeError:
+                continue
+            if any(obj_id != obj.id for obj_id in ids):
+                raise ValueError("{} {} already exists".format(name, value))
+
+    def load(self, cls: type):
+        """ Load all objects from file, then replay the journal on top
+
+        The snapshot is parsed one object at a time and each object is
+        instantiated as soon as it is parsed, so loading only holds the
+        instances and the JSON dictionary of one object at a time
+        instead of the whole document
+        """
+        s_class = cls.__name__
+        file_path = ".db_{}.json".format(s_class)
+        journal_path = ".db_{}.journal".format(s_class)
+        with files_lock(s_class):
+            DATA[s_class] = {}
+            JOURNAL_SIZES[s_class] = 0
+            self._reset_indexes(cls)
+
+            if path.exists(file_path):
+                with open(file_path, 'r') as f:
+                    for obj_id, obj_json in iter_json_object(f):
+                        DATA[s_class][obj_id] = cls(**obj_json)
+
+            if path.exists(journal_path):
+                for record in iter_journal(journal_path):
+                    if record['op'] == 'save':
+                        DATA[s_class][record['id']] = cls(**record['obj'])
+                    else:
+                        DATA[s_class].pop(record['id'], None)
+                    JOURNAL_SIZES[s_class] += 1
+
+        for obj_id, obj in DATA[s_class].items():
+            self._index_add(cls, obj_id, obj)
+
+    def _snapshot_items(self, cls: type) -> Iterable[tuple]:
+        """ (id, JSON dict) of every object to write in the snapshot
+
+        In journal mode other processes may have appended to the journal
+        too, so the snapshot on disk is merged with the whole journal
+        instead of being rewritten from the objects of this process
+        """
+        s_class = cls.__name__
+        file_path = ".db_{}.json".format(s_class)
+        journal_path = ".db_{}.journal".format(s_class)
+        if PERSISTENCE != 'journal':
+            for obj_id, obj in self._data(cls).items():
+                yield obj_id, obj.to_json(True)
+            return
+
+        changes = {}
+        if path.exists(journal_path):
+            for record in iter_journal(journal_path):
+                changes[record['id']] = record.get('obj')
+        if path.exists(file_path):
+            with open(file_path, 'r') as f:
+                for obj_id, obj in iter_json_object(f):
+                    if obj_id in changes:
+                        obj = changes.pop(obj_id)
+                    if obj is not None:
+                        yield obj_id, obj
+        for obj_id, obj in changes.items():
+            if obj is not None:
+                yield obj_id, obj
+
+    def save_all(self, cls: type):
+        """ Save all objects to file
+
+        The snapshot is written to a temporary file and moved over the
+        previous one, after which the journal it includes is emptied.
+        Objects are serialized one at a time
+        """
+        s_class = cls.__name__
+        file_path = ".db_{}.json".format(s_class)
+        journal_path = ".db_{}.journal".format(s_class)
+        with files_lock(s_class):
+            tmp_path = "{}.tmp".format(file_path)
+            with open(tmp_path, 'w') as f:
+                f.write('{')
+                for i, (obj_id, obj) in enumerate(self._snapshot_items(cls)):
+                    f.write('{}{}: {}'.format(', ' if i else '',
+                                              json.dumps(obj_id),
+                                              json.dumps(obj)))
+                f.write('}')
+            os.replace(tmp_path, file_path)
+            if path.exists(journal_path):
+                os.remove(journal_path)
+            JOURNAL_SIZES[s_class] = 0
+
+    def append_to_journal(self, cls: type, record: dict):
+        """ Append one save/remove record to the journal and compact it
+            into the snapshot once it reaches JOURNAL_COMPACT_THRESHOLD
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        line = "{}\n".format(json.dumps(record)).encode('utf-8')
+        with files_lock(s_class):
+            # the flock keeps other processes from compacting the journal
+            # while it is appended to
+            fd = os.open(journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            JOURNAL_SIZES[s_class] = JOURNAL_SIZES.get(s_class, 0) + 1
+            if JOURNAL_SIZES[s_class] >= JOURNAL_COMPACT_THRESHOLD:
+                self.save_all(cls)
+
+    def persist(self, cls: type, record: dict):
+        """ Persist a save/remove according to PERSISTENCE
+        """
+        if PERSISTENCE == 'journal':
+            self.append_to_journal(cls, record)
+        else:
+            self.save_all(cls)
+
+    def save(self, obj: TypeVar('Base')):
+        """ Save obj and persist it
+
+        The uniqueness check, the index updates and the write happen
+        under FILE_LOCK, so concurrent requests can't both pass the check
+        or interleave in the indexes
+        """
+        cls = obj.__class__
+        with FILE_LOCK:
+            data = self._data(cls)
+            self._check_unique(obj)
+            data[obj.id] = obj
+            self._index_discard(cls, obj.id)
+            self._index_add(cls, obj.id, obj)
+            self.persist(cls, {'op': 'save', 'id': obj.id,
+                               'obj': obj.to_json(True)})
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Remove obj and persist it, under FILE_LOCK like save
+        """
+        cls = obj.__class__
+        with FILE_LOCK:
+            data = self._data(cls)
+            if data.get(obj.id) is not None:
+                del data[obj.id]
+                self._index_discard(cls, obj.id)
+                self.persist(cls, {'op': 'remove', 'id': obj.id})
+
+    def count(self, cls: type) -> int:
+        """ Count all objects of cls
+        """
+        return len(self._data(cls).keys())
+
+    def get(self, cls: type, id: str) -> TypeVar('Base'):
+        """ Return one object of cls by ID
+        """
+        return self._data(cls).get(id)
+
+    def search(self, cls: type, attributes: dict = {}
+               ) -> List[TypeVar('Base')]:
+        """ Search all objects of cls with matching attributes
+
+        Equality on an indexed attribute is answered from its index,
+        the remaining attributes are only checked on those candidates
+        """
+        s_class = cls.__name__
+        data = self._data(cls)
+        candidates = None
+        for k, v in attributes.items():
+            if k not in INDEXES[s_class]:
+                continue
+            try:
+                candidates = [data[obj_id]
+                              for obj_id in self._index_ids(s_class, k, v)]
+            except TypeError:
+                continue
+            break
+        if candidates is None:
+            candidates = list(data.values())
+
+        return [obj for obj in candidates if matches(obj, attributes)]
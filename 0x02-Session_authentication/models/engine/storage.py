@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+""" Storage module
+"""
+from abc import ABC, abstractmethod
+from typing import TypeVar, List
+
+
+class Storage(ABC):
+    """ Interface of the storage engines behind Base
+
+    Every method receives the Base subclass (or instance) it works on,
+    so one engine instance serves all the models
+    """
+
+    @abstractmethod
+    def load(self, cls: type):
+        """ Load (or connect to) the stored objects of cls
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_all(self, cls: type):
+        """ Flush every object of cls to persistent storage
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def save(self, obj: TypeVar('Base')):
+        """ Insert or update obj
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete obj
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self, cls: type) -> int:
+        """ Number of stored objects of cls
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, cls: type, id: str) -> TypeVar('Base'):
+        """ Return the object of cls with this id, or None
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(self, cls: type, attributes: dict = {}
+               ) -> List[TypeVar('Base')]:
+        """ Return the objects of cls whose attributes are equal to
+            the given ones
+        """
+        raise NotImplementedError
+
+
+def matches(obj: TypeVar('Base'), attributes: dict) -> bool:
+    """ True if every attribute of obj equals the given value
+    """
+    for k, v in attributes.items():
+        if (getattr(obj, k) != v):
+            return False
+    return True
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+""" Password hashing schemes of the User model
+
+Hashes are computed inline by the calling thread: the PBKDF2 of
+hashlib releases the GIL while it runs, so concurrent requests already
+hash in parallel and handing the work to another thread would only add
+a hop while the request thread waits for it anyway.
+"""
+from os import getenv
+import hashlib
+import hmac
+import os
+import re
+
+
+SCHEME = "pbkdf2_sha256"
+ITERATIONS = int(getenv('PASSWORD_PBKDF2_ITERATIONS', 600000))
+LEGACY_SHA256 = re.compile(r'[0-9a-f]{64}')
+
+
+def _pbkdf2(pwd: str, salt: str, iterations: int) -> str:
+    """ Hex PBKDF2-HMAC-SHA256 of pwd
+    """
+    return hashlib.pbkdf2_hmac('sha256', pwd.encode(), salt.encode(),
+                               iterations).hex()
+
+
+def hash_password(pwd: str) -> str:
+    """ Hash pwd as pbkdf2_sha256$<iterations>$<salt>$<hex digest>
+    """
+    salt = os.urandom(16).hex()
+    digest = _pbkdf2(pwd, salt, ITERATIONS)
+    return "{}${}${}${}".format(SCHEME, ITERATIONS, salt, digest)
+
+
+def verify_password(hashed: str, pwd: str) -> bool:
+    """ Check pwd against a PBKDF2 hash or a legacy unsalted SHA256
+        hex digest, comparing in constant time
+    """
+    if LEGACY_SHA256.fullmatch(hashed):
+        digest = hashlib.sha256(pwd.encode()).hexdigest().lower()
+        return hmac.compare_digest(digest, hashed)
+    try:
+        scheme, iterations, salt, expected = hashed.split('$')
+        iterations = int(iterations)
+    except ValueError:
+        return False
+    if scheme != SCHEME:
+        return False
+    return hmac.compare_digest(_pbkdf2(pwd, salt, iterations), expected)
+
+
+def needs_upgrade(hashed: str) -> bool:
+    """ True if hashed isn't a PBKDF2 hash with the current iterations
+    """
+    return not hashed.startswith("{}${}$".format(SCHEME, ITERATIONS))
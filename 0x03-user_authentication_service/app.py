@@ -18,6 +18,13 @@ def hello_world() -> str:
     """
     return jsonify({'message': 'Bienvenue'})
 
+
+@app.teardown_appcontext
+def remove_db_session(exception=None) -> None:
+    """ Release the database session of the request thread
+    """
+    AUTH.remove_db_session()
+
 @app.route('/users', methods=['POST'], strict_slashes=False)
 def create_users() -> str:
     """ Endpoint to create User objects
@@ -2,20 +2,71 @@
 """ auth module
 """
 import bcrypt
+import time
 from db import DB
+from functools import partial
+from itertools import islice
+from multiprocessing import Pool
+from os import getenv
+from typing import Iterable, Tuple
 from uuid import uuid4
 from user import User
-from sqlalchemy.exc import InvalidRequestError , NoResultFound
+from sqlalchemy.exc import IntegrityError, InvalidRequestError , NoResultFound
 
 
-def _hash_password(password: str) -> bytearray:
+DEFAULT_ROUNDS = 12
+
+
+def _hash_password(password: str, rounds: int = DEFAULT_ROUNDS) -> bytearray:
     """ Hash the given password
         and return the Hash
     """
     bytespw = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=rounds)
     return bcrypt.hashpw(bytespw, salt)
 
+
+def _hash_rounds(hashed_password: bytes) -> int:
+    """ Return the cost a bcrypt hash ($2b$<rounds>$...) was computed with
+    """
+    return int(hashed_password[4:6])
+
+
+def _calibrate_rounds(target: float = 0.25, minimum: int = 10,
+                      maximum: int = 16) -> int:
+    """ Return the highest bcrypt cost, between minimum and maximum,
+        whose hashing takes at most target seconds on this machine
+        (each extra round doubles the time measured at minimum)
+    """
+    salt = bcrypt.gensalt(rounds=minimum)
+    elapsed = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        bcrypt.hashpw(b'calibration', salt)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    rounds = minimum
+    while rounds < maximum and elapsed * 2 <= target:
+        rounds += 1
+        elapsed *= 2
+    return rounds
+
+
+def _bcrypt_rounds() -> int:
+    """ Return the bcrypt cost to hash passwords with:
+          - BCRYPT_ROUNDS if it is a number
+          - calibrated to take BCRYPT_TARGET_MS (default 250)
+            milliseconds if BCRYPT_ROUNDS is auto
+          - DEFAULT_ROUNDS otherwise
+    """
+    rounds = getenv('BCRYPT_ROUNDS')
+    if rounds == 'auto':
+        target = int(getenv('BCRYPT_TARGET_MS', 250)) / 1000
+        return _calibrate_rounds(target)
+    try:
+        return int(rounds)
+    except (TypeError, ValueError):
+        return DEFAULT_ROUNDS
+
 def _generate_uuid() -> str:
     """ Return a string representation of a unique identifier
     """
@@ -26,8 +77,14 @@ class Auth:
     """Auth class to interact with the authentication database.
     """
 
-    def __init__(self):
-        self._db = DB()
+    def __init__(self, persistent: bool = None):
+        self._db = DB(persistent)
+        self._rounds = _bcrypt_rounds()
+
+    def remove_db_session(self) -> None:
+        """ Release the database session of the current thread
+        """
+        self._db.remove_session()
 
     def register_user(self, email: str, password: str) -> User:
         """ Hash password and save new user to the database
@@ -43,12 +100,60 @@ class Auth:
             if user:
                 raise ValueError(f"User {email} already exists")
         except (NoResultFound, InvalidRequestError) as e:
-            pwd = _hash_password(password)
+            pwd = _hash_password(password, self._rounds)
             return self._db.add_user(email, pwd)
 
+    def register_users(self, users: Iterable[Tuple[str, str]],
+                       batch_size: int = 1000,
+                       workers: int = None) -> Tuple[int, int]:
+        """ Register the (email, password) pairs of users, batch_size
+            at a time:
+              - emails already registered, repeated in the batch or
+                missing a password are skipped, with one query per batch
+              - the passwords are hashed by a pool of workers processes
+                (default: one per CPU)
+              - the batch is inserted with a single executemany
+            Return the numbers of users created and skipped
+        """
+        created = skipped = 0
+        users = iter(users)
+        hash_password = partial(_hash_password, rounds=self._rounds)
+        with Pool(workers) as pool:
+            while True:
+                batch = list(islice(users, batch_size))
+                if not batch:
+                    break
+                new_users = {}
+                for email, password in batch:
+                    if email and password and email not in new_users:
+                        new_users[email] = password
+                for email in self._db.existing_emails(new_users):
+                    del new_users[email]
+                hashes = pool.map(hash_password, new_users.values(),
+                                  chunksize=16)
+                new_users = dict(zip(new_users, hashes))
+                while True:
+                    try:
+                        self._db.add_users([
+                            {'email': email, 'hashed_password': hashed}
+                            for email, hashed in new_users.items()])
+                        break
+                    except IntegrityError:
+                        # registered by someone else since the check
+                        existing = self._db.existing_emails(new_users)
+                        if not existing:
+                            raise
+                        for email in existing:
+                            del new_users[email]
+                created += len(new_users)
+                skipped += len(batch) - len(new_users)
+        return created, skipped
+
     def valid_login(self, email: str, password: str) -> bool:
         """ Verify that a user exists with the given email and
             password
+            A valid password hashed with a lower cost than the current
+            one is rehashed with it
         """
         if email and password:
             try:
@@ -57,12 +162,26 @@ class Auth:
                 if user:
                     pass_bytes = password.encode('utf-8')
                     if bcrypt.checkpw(pass_bytes, user.hashed_password):
+                        self._rehash_password(user, password)
                         return True
                     return False
             except Exception as e:
                 return False
         return False
 
+    def _rehash_password(self, user: User, password: str) -> None:
+        """ Rehash the verified password of user if its hash has a lower
+            cost than the current one, never failing the login
+            (never lowering it either: workers calibrated with
+            BCRYPT_ROUNDS=auto may settle on adjacent costs)
+        """
+        try:
+            if _hash_rounds(user.hashed_password) < self._rounds:
+                hashed = _hash_password(password, self._rounds)
+                self._db.update_user(user.id, hashed_password=hashed)
+        except Exception as e:
+            return None
+
     def create_session(self, email: str) -> str:
         """ Find the user corresponding to the email,
             generate a unique identifier and store that as the session id
@@ -71,11 +190,8 @@ class Auth:
         if email:
             email_dict = {'email': email}
             try:
-                user = self._db.find_user_by(**email_dict)
-                if user:
-                    iden = _generate_uuid()
-                    update_dict = {"session_id": iden}
-                    self._db.update_user(user.id, **update_dict)
+                iden = _generate_uuid()
+                if self._db.update_user_by(email_dict, session_id=iden):
                     return iden
             except Exception as e:
                 return None
@@ -98,8 +214,6 @@ class Auth:
         """
         if user_id:
             try:
-                sesh_dict = {'id': user_id}
-                user = self._db.find_user_by(**sesh_dict)
                 update_dict = {'session_id': None}
                 self._db.update_user(user_id, **update_dict)
                 return None
@@ -128,7 +242,7 @@ class Auth:
             try:
                 reset_dict = {'reset_token': reset_token}
                 user = self._db.find_user_by(**reset_token)
-                hashed = _hash_password(password)
+                hashed = _hash_password(password, self._rounds)
                 hash_dict = {'hashed_password': hashed, reset_token: None}
                 self._db.update_user(user.id, **hash_dict)
             except Exception as e:
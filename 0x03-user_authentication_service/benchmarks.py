@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+""" Benchmarks for the user authentication service
+
+Usage:
+    ./benchmarks.py <name> [args...]
+
+Every benchmark runs in a temporary directory, so the a.db of the
+current directory is left alone.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+
+# (column, index expected to answer the lookups on it)
+LOOKUPS = [
+    ('email', 'ix_users_email'),
+    ('session_id', 'ix_users_session_id'),
+    ('reset_token', 'ix_users_reset_token'),
+]
+
+
+def _in_tmp_dir(function):
+    """ Run function from a temporary directory
+    """
+    def wrapper(*args):
+        cwd = os.getcwd()
+        sys.path.insert(0, cwd)
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                return function(*args)
+            finally:
+                os.chdir(cwd)
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+
+def _query_plan(db, column: str) -> str:
+    """ SQLite query plan of the DB.find_user_by lookup on column
+    """
+    from user import User
+
+    query = db._session.query(User).filter_by(**{column: 'value'})
+    sql = str(query.statement.compile(db._engine,
+                                      compile_kwargs={"literal_binds": True}))
+    with db._engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+@_in_tmp_dir
+def bench_query_plan() -> None:
+    """ Check that the lookups of find_user_by use the column indexes,
+        exits with 1 if one of them scans the table
+    """
+    from db import DB
+
+    db = DB()
+    failed = False
+    for column, index in LOOKUPS:
+        plan = _query_plan(db, column)
+        ok = "USING INDEX {}".format(index) in plan
+        failed = failed or not ok
+        print("{:<12} {:<4} {}".format(column, "ok" if ok else "SCAN", plan))
+    if failed:
+        sys.exit(1)
+
+
+def _populate(engine, count: int, batch_size: int = 10000) -> list:
+    """ Insert count users with a session into the users table,
+        return their session ids
+    """
+    from user import User
+
+    session_ids = []
+    with engine.begin() as conn:
+        for start in range(0, count, batch_size):
+            rows = []
+            for i in range(start, min(start + batch_size, count)):
+                session_id = str(uuid.uuid4())
+                session_ids.append(session_id)
+                rows.append({'email': "user{}@hbtn.io".format(i),
+                             'hashed_password': "x",
+                             'session_id': session_id})
+            conn.execute(User.__table__.insert(), rows)
+    return session_ids
+
+
+def _profile_latencies(client, session_ids: list, requests: int) -> list:
+    """ Milliseconds taken by requests GET /profile of random sessions
+    """
+    latencies = []
+    for session_id in random.sample(session_ids, requests):
+        client.set_cookie("session_id", session_id)
+        start = time.perf_counter()
+        response = client.get("/profile")
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200
+    return sorted(latencies)
+
+
+@_in_tmp_dir
+def bench_profile(sizes: str = "10000,100000,1000000",
+                  requests: str = "200") -> None:
+    """ GET /profile latency with each number of users in sizes, with
+        the session_id index and again after dropping it
+    """
+    from sqlalchemy import text
+    from app import AUTH, app
+    from user import Base
+
+    requests = int(requests)
+    engine = AUTH._db._engine
+    client = app.test_client()
+    for size in (int(size) for size in sizes.split(',')):
+        AUTH._db._session.close()
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        session_ids = _populate(engine, size)
+        print("{} users".format(size))
+        for label, count in (("indexed", requests),
+                             ("no index", max(1, requests // 10))):
+            if label == "no index":
+                AUTH._db._session.close()
+                with engine.begin() as conn:
+                    conn.execute(text("DROP INDEX ix_users_session_id"))
+            latencies = _profile_latencies(client, session_ids, count)
+            print("  {:<8}  median {:>8.2f} ms  p99 {:>8.2f} ms".format(
+                label, median(latencies),
+                latencies[int(len(latencies) * 0.99)]))
+
+
+def _client_worker(app, session_ids: list, slots: range, requests: int,
+                   write_every: int) -> int:
+    """ GET /profile requests times with the sessions of session_ids
+        at slots, replacing the session by a new one every write_every
+        requests (the session writes of a logout and login)
+    """
+    from app import AUTH
+
+    client = app.test_client()
+    for i in range(requests):
+        slot = slots[i % len(slots)]
+        session_id = session_ids[slot]
+        if write_every and i % write_every == write_every - 1:
+            user = AUTH.get_user_from_session_id(session_id)
+            AUTH.destroy_session(user.id)
+            session_id = AUTH.create_session(user.email)
+            AUTH.remove_db_session()
+            session_ids[slot] = session_id
+        client.set_cookie("session_id", session_id)
+        assert client.get("/profile").status_code == 200
+    return requests
+
+
+@_in_tmp_dir
+def bench_concurrency(users: str = "10000", requests: str = "2000",
+                      write_every: str = "10") -> None:
+    """ Requests/second of GET /profile (and a session rotation every
+        write_every requests) shared by 1 to 16 threads
+    """
+    from app import AUTH, app
+
+    users, requests = int(users), int(requests)
+    session_ids = _populate(AUTH._db._engine, users)
+    for threads in (1, 2, 4, 8, 16):
+        # each thread works on its own users
+        shares = [range(i, users, threads) for i in range(threads)]
+        with ThreadPoolExecutor(threads) as executor:
+            start = time.perf_counter()
+            done = sum(executor.map(
+                lambda slots: _client_worker(app, session_ids, slots,
+                                             requests // threads,
+                                             int(write_every)),
+                shares))
+            elapsed = time.perf_counter() - start
+        print("{:>2} threads: {:>8.0f} requests/s".format(
+            threads, done / elapsed))
+
+
+BENCHMARKS = {
+    'query_plan': bench_query_plan,
+    'profile': bench_profile,
+    'concurrency': bench_concurrency,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print("Usage: {} <{}> [args...]".format(
+            sys.argv[0], "|".join(BENCHMARKS)))
+        sys.exit(1)
+    BENCHMARKS[sys.argv[1]](*sys.argv[2:])
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Register users in bulk from a CSV file (with email and password
+columns) or a JSON lines file (one {"email", "password"} object a line)
+"""
+from typing import Iterable, Tuple
+import argparse
+import csv
+import json
+import sys
+import time
+
+from auth import Auth
+
+
+def iter_csv_users(path: str) -> Iterable[Tuple[str, str]]:
+    """ Yield the (email, password) of each row of the CSV file path
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            yield row.get('email'), row.get('password')
+
+
+def iter_jsonl_users(path: str) -> Iterable[Tuple[str, str]]:
+    """ Yield the (email, password) of each line of the JSON lines
+        file path
+    """
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                user = json.loads(line)
+                yield user.get('email'), user.get('password')
+
+
+def main() -> None:
+    """ Command line entry point, reports the throughput on stderr
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('src', help="file of users to register")
+    parser.add_argument('--jsonl', action='store_true',
+                        help="src is JSON lines (default when it ends "
+                        "with .jsonl)")
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help="users checked and inserted at a time")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="password hashing processes (default: one "
+                        "per CPU)")
+    args = parser.parse_args()
+
+    if args.jsonl or args.src.endswith('.jsonl'):
+        users = iter_jsonl_users(args.src)
+    else:
+        users = iter_csv_users(args.src)
+    auth = Auth(persistent=True)
+
+    start = time.perf_counter()
+    created, skipped = auth.register_users(users, args.batch_size,
+                                           args.workers)
+    elapsed = time.perf_counter() - start
+    print("{} users created, {} skipped in {:.2f}s ({:.0f} users/s)".format(
+        created, skipped, elapsed,
+        (created + skipped) / elapsed if elapsed else 0), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,52 +1,159 @@
 #!/usr/bin/env python3
 """DB module
 """
-from sqlalchemy import create_engine, tuple_
+from sqlalchemy import create_engine, event, insert, select, tuple_, update
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, attributes
+from sqlalchemy.orm import scoped_session, sessionmaker, attributes
 from sqlalchemy.orm.session import Session
 from sqlalchemy.exc import InvalidRequestError , NoResultFound
 # from sqlalchemy.orm.exc import NoResultFound
 
 from user import Base
 from user import User
-from typing import Dict
+from os import getenv
+from typing import Dict, Iterable, List, Set
+
+
+# Migrations are fixed DDL, never derived from the current User model:
+# a change to the model needs a new migration, which then runs the same
+# way on new and existing databases
+def _create_users_table(conn) -> None:
+    """ Migration 1: the users table as first shipped
+    """
+    conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "id INTEGER NOT NULL, "
+            "email VARCHAR(250) NOT NULL, "
+            "hashed_password VARCHAR(250) NOT NULL, "
+            "session_id VARCHAR(250), "
+            "reset_token VARCHAR(250), "
+            "PRIMARY KEY (id))")
+
+
+def _create_users_indexes(conn) -> None:
+    """ Migration 2: unique indexes of the lookup columns
+    """
+    for column in ('email', 'session_id', 'reset_token'):
+        conn.exec_driver_sql(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_{0} "
+                "ON users ({0})".format(column))
+
+
+# applied in order, the number of migrations applied to a database is
+# kept in its PRAGMA user_version
+MIGRATIONS = [
+    _create_users_table,
+    _create_users_indexes,
+]
+
+
+def _configure_connection(dbapi_connection, connection_record) -> None:
+    """ Put every new SQLite connection in WAL mode, so that readers
+        don't block the writer, and make it wait DB_BUSY_TIMEOUT_MS
+        (default 5000) milliseconds for a lock instead of failing
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout={:d}".format(
+        int(getenv('DB_BUSY_TIMEOUT_MS', 5000))))
+    cursor.close()
+
+
+def _schema_version(conn) -> int:
+    """ Return the number of migrations applied to the database
+    """
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrate(engine) -> int:
+    """ Apply the migrations the database doesn't have yet, each in its
+        own transaction, and return the resulting schema version
+    """
+    with engine.connect() as conn:
+        version = _schema_version(conn)
+    for i, migration in enumerate(MIGRATIONS[version:], version + 1):
+        with engine.begin() as conn:
+            migration(conn)
+            conn.exec_driver_sql("PRAGMA user_version = {:d}".format(i))
+    return len(MIGRATIONS)
 
 
 class DB:
     """DB class
     """
 
-    def __init__(self) -> None:
+    def __init__(self, persistent: bool = None) -> None:
         """Initialize a new DB instance
+          - persistent (default: DB_PERSISTENT env variable set to 1):
+            keep the existing data and only apply the missing
+            migrations, instead of recreating the tables from the
+            first migration
         """
-        self._engine = create_engine("sqlite:///a.db", echo=False)
-        Base.metadata.drop_all(self._engine)
-        Base.metadata.create_all(self._engine)
-        self.__session = None
+        if persistent is None:
+            persistent = getenv('DB_PERSISTENT', '0') == '1'
+        self._engine = create_engine(
+                "sqlite:///a.db", echo=False,
+                connect_args={"check_same_thread": False})
+        event.listen(self._engine, "connect", _configure_connection)
+        if not persistent:
+            Base.metadata.drop_all(self._engine)
+            with self._engine.begin() as conn:
+                conn.exec_driver_sql("PRAGMA user_version = 0")
+        migrate(self._engine)
+        self.__session = scoped_session(sessionmaker(bind=self._engine))
 
     @property
     def _session(self) -> Session:
-        """Memoized session object
+        """Session object of the current thread
+        """
+        return self.__session()
+
+    def remove_session(self) -> None:
+        """ Close the session of the current thread (at the end of a
+            request), the next call to _session starts a new one
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        self.__session.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """ Create a new user and add it to the database
         """
+        session = self._session
         try:
             new_user = User(email=email, hashed_password=hashed_password)
-            self._session.add(new_user)
+            session.add(new_user)
 
-            self.__session.commit()
+            session.commit()
         except Exception as e:
-            self.__session.rollback()
+            session.rollback()
             new_user = None
         return new_user
 
+    def add_users(self, users: List[Dict]) -> None:
+        """ Insert many users at once with a single executemany,
+            users holds one dictionary of email and hashed_password
+            per user
+        """
+        if not users:
+            return None
+        session = self._session
+        try:
+            session.execute(insert(User), users)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+    def existing_emails(self, emails: Iterable[str]) -> Set[str]:
+        """ Return which of emails already belong to a user, with one
+            SELECT ... WHERE email IN (...)
+        """
+        emails = list(emails)
+        if not emails:
+            return set()
+        statement = select(User.email).where(User.email.in_(emails))
+        return set(self._session.scalars(statement))
+
     def find_user_by(self, **kwargs: Dict) -> User:
         """ Finds a user based on a set of filters
         """
@@ -59,19 +166,57 @@ class DB:
             raise InvalidRequestError()
         return user
 
+    def _check_columns(self, names) -> None:
+        """ Raise a ValueError if one of names isn't a column of users
+        """
+        columns = User.__table__.columns
+        for name in names:
+            if name not in columns:
+                raise ValueError(f"User has no attribute {name}")
+
+    def update_user_by(self, filters: Dict, **kwargs: Dict) -> int:
+        """ Updates the users matching filters with a single
+            UPDATE ... WHERE statement, without loading them
+            Return the number of users updated
+          - filters can't be empty: updating every user isn't allowed
+        """
+        if not filters:
+            raise ValueError("No filter given")
+        self._check_columns(filters)
+        self._check_columns(kwargs)
+        if not kwargs:
+            return 0
+        session = self._session
+        statement = update(User).filter_by(**filters).values(**kwargs)
+        try:
+            result = session.execute(statement)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        return result.rowcount
+
     def update_user(self, user_id: int, **kwargs: Dict) -> None:
         """ Updates a user object
         """
+        self.update_user_by({"id": user_id}, **kwargs)
+
+    def update_users(self, values: List[Dict]) -> None:
+        """ Updates many users at once, values holds one dictionary per
+            user with its id and the attributes to set
+            (one executemany of UPDATE ... WHERE id = ?)
+        """
+        values = list(values)
+        for row in values:
+            if "id" not in row:
+                raise ValueError("Missing user id")
+            self._check_columns(row)
+        if not values:
+            return None
         session = self._session
-        dictionary = {"id": user_id}
         try:
-            user = self.find_user_by(**dictionary)
-            if user:
-                for key, value in kwargs.items():
-                    attributes.set_attribute(user, key, value)
-
-                session.commit()
-            else:
-                return None
-        except Exception as e:
-            return None
+            session.execute(update(User), values)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise